@@ -2,10 +2,12 @@ import warnings
 warnings.filterwarnings("ignore")
 
 import math
+import time
 import datetime as dt
 from typing import List, Dict, Any, Tuple, Optional
 
 import requests
+import numpy as np
 import pandas as pd
 import yfinance as yf
 
@@ -16,6 +18,12 @@ import yfinance as yf
 MESES_HORIZONTE = 6
 DERIBIT_BASE = "https://www.deribit.com/api/v2"
 
+# Superficie de volatilidad
+SURFACE_TTL = 900                                # 15 min de cache por ticker
+SURFACE_K_GRID = np.linspace(-0.4, 0.4, 33)      # log-moneyness ln(K/S)
+SURFACE_SMOOTH = 5                               # ventana (strikes) de mediana móvil
+SURFACE_SKEW_K = 0.10                            # skew = iv(-k) - iv(+k)
+
 LISTA_TICKERS = [
     "SPY", "QQQ", "IWM", "DIA",
     "AAPL", "MSFT", "GOOGL", "AMZN", "META", "NVDA", "TSLA",
@@ -300,10 +308,231 @@ def analyze_forward(df):
     return trend, total_change, vol
 
 
+# ============================================================
+# SUPERFICIE DE VOLATILIDAD
+# ============================================================
+# ticker -> superficie (ver build_vol_surface)
+_SURFACE_CACHE: Dict[str, Dict[str, Any]] = {}
+
+
+def build_vol_surface(chain, spot):
+    """
+    Grilla IV suavizada: filas = expiries (ordenadas por T), columnas = SURFACE_K_GRID.
+    Por expiry: mediana por strike, mediana móvil en strike e interpolación
+    lineal a la grilla de moneyness (plana fuera del rango listado).
+    La moneyness de cada expiry se mide contra su propio subyacente (en
+    Deribit underlying_price es el futuro de esa expiry); `spot` es el fallback.
+    """
+    today = dt.date.today()
+    df = chain.dropna(subset=["iv"])
+    df = df[df["strike"] > 0]
+
+    expiries, T, spots, rows = [], [], [], []
+    for exp, sub in df.groupby("expiry"):
+        dte = (exp - today).days
+        if dte <= 0 or len(sub) < 3:
+            continue
+
+        exp_spot = sub["spot"].dropna()
+        exp_spot = float(exp_spot.mean()) if not exp_spot.empty else float(spot)
+
+        sub = sub.groupby("strike", as_index=False)["iv"].median().sort_values("strike")
+        k = np.log(sub["strike"].to_numpy(dtype=float) / exp_spot)
+        iv = sub["iv"].rolling(SURFACE_SMOOTH, center=True, min_periods=1).median().to_numpy(dtype=float)
+
+        rows.append(np.interp(SURFACE_K_GRID, k, iv))
+        expiries.append(exp)
+        T.append(dte / 365)
+        spots.append(exp_spot)
+
+    if not rows:
+        return None
+
+    order = np.argsort(T)
+    return {
+        "spot": float(spot),
+        "expiries": [expiries[i] for i in order],
+        "T": np.array(T)[order],
+        "spots": np.array(spots)[order],
+        "iv": np.vstack(rows)[order],
+        "built_at": time.time()
+    }
+
+
+def surface_spot(surface, T):
+    """
+    Subyacente de referencia para T (años): lineal entre los de cada expiry.
+    """
+    return np.interp(np.asarray(T, dtype=float), surface["T"], surface["spots"])
+
+
+def surface_iv(surface, strikes, T):
+    """
+    IV para pares (strike, T en años), vectorizado.
+    Lineal en moneyness dentro de cada expiry y lineal en varianza total
+    (iv² · T) entre expiries; vol plana fuera de la grilla.
+    """
+    strikes, T = np.broadcast_arrays(np.asarray(strikes, dtype=float), np.asarray(T, dtype=float))
+    shape = strikes.shape
+    strikes, T = strikes.ravel(), T.ravel()
+
+    K = SURFACE_K_GRID
+    grid = surface["iv"]
+    Ts = surface["T"]
+
+    # interpolación en moneyness (contra el subyacente de cada expiry),
+    # para todas las expiries a la vez -> (E, N)
+    kk = np.clip(np.log(strikes[None, :] / surface["spots"][:, None]), K[0], K[-1])
+    j = np.clip(np.searchsorted(K, kk) - 1, 0, len(K) - 2)
+    wk = (kk - K[j]) / (K[j + 1] - K[j])
+    iv_k = np.take_along_axis(grid, j, axis=1) * (1 - wk) + np.take_along_axis(grid, j + 1, axis=1) * wk
+
+    if len(Ts) == 1:
+        return iv_k[0].reshape(shape)
+
+    # interpolación en varianza total entre expiries
+    tt = np.clip(T, Ts[0], Ts[-1])
+    i = np.clip(np.searchsorted(Ts, tt) - 1, 0, len(Ts) - 2)
+    wt = (tt - Ts[i]) / (Ts[i + 1] - Ts[i])
+    n = np.arange(tt.size)
+    w = (iv_k[i, n] ** 2 * Ts[i]) * (1 - wt) + (iv_k[i + 1, n] ** 2 * Ts[i + 1]) * wt
+    return np.sqrt(w / tt).reshape(shape)
+
+
+def _cache_surface(ticker, chain):
+    spot = chain["spot"].dropna()
+    if spot.empty:
+        return None
+    surface = build_vol_surface(chain, float(spot.mean()))
+    if surface is not None:
+        _SURFACE_CACHE[ticker] = surface
+    return surface
+
+
+def get_vol_surface(ticker: str):
+    """
+    Superficie cacheada por ticker; sólo baja cadenas si venció SURFACE_TTL.
+    Si el refresco falla y hay una superficie vieja, se sirve ésa.
+    """
+    ticker = ticker.upper()
+    cached = _SURFACE_CACHE.get(ticker)
+    if cached is not None and time.time() - cached["built_at"] < SURFACE_TTL:
+        return cached
+
+    try:
+        chain, _ = fetch_chain(ticker)
+        surface = _cache_surface(ticker, chain)
+    except Exception as e:
+        if cached is None:
+            raise
+        print(f"Vol surface {ticker}: refresh falló, sirviendo superficie vieja ({e})")
+        return cached
+
+    if surface is None:
+        if cached is not None:
+            return cached
+        raise ValueError("Ticker sin datos de volatilidad")
+    return surface
+
+
+def vol_surface_for_api(ticker: str):
+    """
+    Grilla completa + term structure ATM + skew por expiry.
+    """
+    ticker = ticker.upper()
+    s = get_vol_surface(ticker)
+    Ts = s["T"]
+    spots = s["spots"]
+
+    # ATM y alas contra el subyacente de cada expiry
+    atm = surface_iv(s, spots, Ts)
+    put_wing = surface_iv(s, spots * math.exp(-SURFACE_SKEW_K), Ts)
+    call_wing = surface_iv(s, spots * math.exp(SURFACE_SKEW_K), Ts)
+
+    return {
+        "ticker": ticker,
+        "spot": s["spot"],
+        "moneyness": SURFACE_K_GRID.round(4).tolist(),
+        "expiries": [e.strftime("%Y-%m-%d") for e in s["expiries"]],
+        "iv": s["iv"].round(6).tolist(),
+        "term_structure": [
+            {"expiry": e.strftime("%Y-%m-%d"), "dte": int(round(t * 365)), "underlying": float(u), "atm_iv": float(a)}
+            for e, t, u, a in zip(s["expiries"], Ts, spots, atm)
+        ],
+        "skew": [
+            {"expiry": e.strftime("%Y-%m-%d"), "put_iv": float(p), "call_iv": float(c), "skew": float(p - c)}
+            for e, p, c in zip(s["expiries"], put_wing, call_wing)
+        ]
+    }
+
+
+def query_vol_for_api(ticker: str, strikes: Optional[List[float]] = None, dates: Optional[List[str]] = None):
+    """
+    IV y expected move para cualquier combinación strike × fecha (YYYY-MM-DD).
+    Por defecto: strike = spot, fechas = expiries de la superficie.
+    Moneyness y expected move se miden contra el subyacente de esa fecha.
+    """
+    ticker = ticker.upper()
+
+    if strikes:
+        try:
+            strikes = [float(k) for k in strikes]
+        except (TypeError, ValueError):
+            raise ValueError(f"Strikes deben ser numéricos: {strikes}")
+        bad = [k for k in strikes if not math.isfinite(k) or k <= 0]
+        if bad:
+            raise ValueError(f"Strikes deben ser positivos: {bad}")
+
+    days = None
+    if dates:
+        days = []
+        for d in dates:
+            try:
+                days.append(dt.datetime.strptime(d, "%Y-%m-%d").date())
+            except (TypeError, ValueError):
+                raise ValueError(f"Fecha inválida (usar YYYY-MM-DD): {d}")
+
+    s = get_vol_surface(ticker)
+    spot = s["spot"]
+    today = dt.date.today()
+
+    strikes = strikes or [spot]
+    if days is None:
+        days = list(s["expiries"])
+    days = [d for d in days if d > today]
+    if not days:
+        raise ValueError("Fechas deben ser posteriores a hoy")
+
+    K, D = np.meshgrid(np.asarray(strikes, dtype=float), np.array([(d - today).days / 365 for d in days]))
+    ref = surface_spot(s, D)
+    iv = surface_iv(s, K, D)
+    atm = surface_iv(s, ref, D)
+    em = ref * atm * np.sqrt(D)
+
+    points = []
+    for r, d in enumerate(days):
+        for c in range(K.shape[1]):
+            points.append({
+                "date": d.strftime("%Y-%m-%d"),
+                "strike": float(K[r, c]),
+                "underlying": float(ref[r, c]),
+                "moneyness": float(math.log(K[r, c] / ref[r, c])),
+                "iv": float(iv[r, c]),
+                "expected_move": float(em[r, c]),
+                "em_up": float(ref[r, c] + em[r, c]),
+                "em_down": float(ref[r, c] - em[r, c])
+            })
+
+    return {"ticker": ticker, "spot": spot, "points": points}
+
+
 # ============================================================
 # API MAIN
 # ============================================================
-def analyze_ticker_for_api(ticker: str):
+def fetch_chain(ticker: str):
+    """
+    Cadena fusionada (expiry, strike, iv, spot) + resumen por expiry.
+    """
     ticker = ticker.upper()
 
     if ticker == "BTC":
@@ -316,6 +545,16 @@ def analyze_ticker_for_api(ticker: str):
         chain = fuse_calls_puts(calls, puts, spot, expiries)
         summary = summarize_yfin(chain, expiries, spot)
 
+    return chain, summary
+
+
+def analyze_ticker_for_api(ticker: str):
+    ticker = ticker.upper()
+
+    chain, summary = fetch_chain(ticker)
+    # aprovechamos la cadena ya bajada para la superficie
+    _cache_surface(ticker, chain)
+
     forward = build_forward_table(chain, summary)
     trend, total_change, vol = analyze_forward(forward)
 
@@ -0,0 +1,233 @@
+import time
+import asyncio
+import datetime as dt
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+from services.cache import cache_get_stale, cache_is_fresh, CACHE_KEYS
+from services.docta_bonds import docta_get_cashflow, docta_get_yields_intraday
+from services.docta_models import DoctaTable, compact, to_json
+from services.docta_client import docta_sema, get_token, price_scenarios
+from jobs.scheduler import market_prices, TTL_YIELDS, TTL_DAILY
+
+# ============================
+# BATCH MULTI-SÍMBOLO
+# ============================
+# dataset -> cache key del scheduler
+BATCH_DATASETS = {
+    "yields": CACHE_KEYS.DOCTA_YIELDS,
+    "cashflows": CACHE_KEYS.DOCTA_CASHFLOWS,
+    "pricer": CACHE_KEYS.DOCTA_PRICER,
+}
+
+# TTL de los resultados on-demand (mismo ritmo que el scheduler para cada dataset)
+BATCH_FETCH_TTL = {
+    "yields": TTL_YIELDS,
+    "cashflows": TTL_DAILY,
+    "pricer": TTL_DAILY,
+}
+
+BATCH_MAX_SYMBOLS = 200
+BATCH_FETCH_MAX = 2048
+# símbolos que Docta no tiene (404): no se vuelven a pedir durante este TTL
+BATCH_NEGATIVE_TTL = 600
+
+# fetches on-demand en vuelo: (dataset, symbol) -> task
+_inflight: Dict[Tuple[str, str], asyncio.Task] = {}
+# cache negativo: (dataset, symbol) -> expires_at
+_negative: Dict[Tuple[str, str], float] = {}
+# resultados on-demand (LRU), separados del cache del scheduler:
+# (dataset, symbol) -> (expires_at, value)
+_fetched: "OrderedDict[Tuple[str, str], Tuple[float, Any]]" = OrderedDict()
+
+
+def _is_negative(key: Tuple[str, str]) -> bool:
+    exp = _negative.get(key)
+    if exp is None:
+        return False
+    if time.time() > exp:
+        _negative.pop(key, None)
+        return False
+    return True
+
+
+def _fetched_get(key: Tuple[str, str]) -> Optional[Any]:
+    item = _fetched.get(key)
+    if item is None:
+        return None
+    if time.time() > item[0]:
+        _fetched.pop(key, None)
+        return None
+    _fetched.move_to_end(key)
+    return item[1]
+
+
+def _fetched_put(key: Tuple[str, str], value: Any) -> None:
+    _fetched[key] = (time.time() + BATCH_FETCH_TTL[key[0]], value)
+    _fetched.move_to_end(key)
+    while len(_fetched) > BATCH_FETCH_MAX:
+        _fetched.popitem(last=False)
+
+
+def _age_seconds(entry: Dict[str, Any]) -> Optional[float]:
+    try:
+        ts = dt.datetime.fromisoformat(entry["timestamp_utc"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    return round((dt.datetime.utcnow() - ts).total_seconds(), 1)
+
+
+async def _fetch_one(dataset: str, sym: str) -> Optional[Any]:
+    token = await get_token()
+    async with docta_sema:
+        if dataset == "yields":
+            return compact(await docta_get_yields_intraday(token, sym, hedge=True))
+        if dataset == "cashflows":
+            return compact(await docta_get_cashflow(token, sym, nominal_units=100.0))
+        if dataset == "pricer":
+            px = market_prices().get(sym)
+            if px is None:
+                return None
+            return await price_scenarios(token, sym, px, dt.date.today().strftime("%Y-%m-%d"))
+    raise ValueError(f"Dataset desconocido: {dataset}")
+
+
+async def _fetch_coalesced(dataset: str, sym: str) -> Optional[Any]:
+    """
+    Un único fetch upstream por (dataset, symbol) aunque lleguen varios batch a la vez.
+    El resultado queda en el cache propio del batch (_fetched) por BATCH_FETCH_TTL.
+    """
+    key = (dataset, sym)
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.create_task(_fetch_one(dataset, sym))
+        _inflight[key] = task
+        task.add_done_callback(lambda _t, k=key: _inflight.pop(k, None))
+
+    # shield: si un cliente corta, no cancelamos el fetch compartido
+    res = await asyncio.shield(task)
+
+    if res is None:
+        _negative[key] = time.time() + BATCH_NEGATIVE_TTL
+    else:
+        _fetched_put(key, res)
+    return res
+
+
+def _field_names(value: Any) -> set:
+    if isinstance(value, DoctaTable):
+        return set(value.keys) | set(value.meta)
+    return set(value) if isinstance(value, dict) else set()
+
+
+def _project(value: Any, fields: Optional[List[str]]) -> Any:
+    """
+    Tablas (yields, cashflows): columnas de cada fila + escalares de primer nivel;
+    si ninguna columna coincide se devuelven sólo los escalares.
+    Resto (pricer): claves de primer nivel (base_price, scenarios, ...).
+    """
+    if fields and isinstance(value, DoctaTable):
+        sel = value.select(fields)
+        return sel.to_json() if sel.keys else sel.meta
+    value = to_json(value)
+    if not fields or not isinstance(value, dict):
+        return value
+    return {f: value.get(f) for f in fields if f in value}
+
+
+async def batch_query(
+    symbols: List[str],
+    datasets: List[str],
+    fields: Optional[List[str]] = None,
+    fetch_missing: bool = True
+) -> Dict[str, Any]:
+    """
+    symbols: lista de tickers (se normalizan a mayúsculas, sin duplicados)
+    datasets: subset de BATCH_DATASETS
+    fields: proyección (ver _project). Si en algún dataset pedido ningún field
+            existe en los datos devueltos -> ValueError (400), en vez de {} silencioso
+
+    Se sirve del cache del scheduler aunque esté vencido (mientras corre el
+    refresh); "cache" informa por dataset la antigüedad y si está vencido.
+    """
+    syms = list(dict.fromkeys(s.upper().strip() for s in symbols if s and s.strip()))
+    if not syms:
+        raise ValueError("symbols vacío")
+    if len(syms) > BATCH_MAX_SYMBOLS:
+        raise ValueError(f"Máximo {BATCH_MAX_SYMBOLS} símbolos por batch")
+
+    unknown = [d for d in datasets if d not in BATCH_DATASETS]
+    if unknown or not datasets:
+        raise ValueError(f"datasets inválidos: {unknown or datasets} (usar {list(BATCH_DATASETS)})")
+
+    out: Dict[str, Any] = {
+        "timestamp_utc": dt.datetime.utcnow().isoformat(),
+        "data": {s: {} for s in syms},
+        "errors": {},
+        "cache": {},
+        "stats": {"cache_hits": 0, "fetched": 0, "missing": 0},
+    }
+
+    # dataset -> campos disponibles en los datos devueltos
+    available: Dict[str, set] = {d: set() for d in datasets}
+    seen_data = set()
+
+    def put(d: str, s: str, res: Any) -> None:
+        if fields:
+            available[d] |= _field_names(res)
+            seen_data.add(d)
+        out["data"][s][d] = _project(res, fields)
+
+    misses: List[Tuple[str, str]] = []
+    for d in datasets:
+        entry = cache_get_stale(BATCH_DATASETS[d]) or {}
+        data = entry.get("data") or {}
+        out["cache"][d] = {
+            "timestamp_utc": entry.get("timestamp_utc"),
+            "age_seconds": _age_seconds(entry),
+            "stale": not cache_is_fresh(BATCH_DATASETS[d]),
+        }
+        for s in syms:
+            res = data[s] if s in data else _fetched_get((d, s))
+            if res is not None:
+                put(d, s, res)
+                out["stats"]["cache_hits"] += 1
+            else:
+                misses.append((d, s))
+
+    # 404 recientes: no vamos a upstream de nuevo
+    pending: List[Tuple[str, str]] = []
+    for d, s in misses:
+        if _is_negative((d, s)):
+            out["data"][s][d] = None
+            out["stats"]["missing"] += 1
+        else:
+            pending.append((d, s))
+    misses = pending
+
+    if misses and fetch_missing:
+        async def worker(d: str, s: str):
+            try:
+                res = await _fetch_coalesced(d, s)
+            except Exception as e:
+                out["errors"].setdefault(s, {})[d] = str(e)
+                return
+            if res is None:
+                out["data"][s][d] = None
+                out["stats"]["missing"] += 1
+                return
+            put(d, s, res)
+            out["stats"]["fetched"] += 1
+
+        await asyncio.gather(*(worker(d, s) for d, s in misses))
+    else:
+        for d, s in misses:
+            out["data"][s][d] = None
+            out["stats"]["missing"] += 1
+
+    unmatched = [d for d in datasets if d in seen_data and not available[d] & set(fields)]
+    if unmatched:
+        hint = {d: sorted(available[d]) for d in unmatched}
+        raise ValueError(f"fields {fields} no existen en {unmatched} (disponibles: {hint})")
+
+    return out
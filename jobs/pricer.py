@@ -0,0 +1,148 @@
+import asyncio
+import datetime as dt
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+from services.cache import cache_get_stale, CACHE_KEYS
+from services.docta_bonds import docta_post_pricer
+from services.docta_client import docta_sema, get_token, PRICER_SETTLEMENT_ENTRY
+
+# ============================
+# PRICER ON-DEMAND (memo + coalescing)
+# ============================
+PRICER_MEMO_MAX = 4096
+
+# decimales a los que se redondea el value según target (precio vs tasas)
+PRICER_VALUE_DECIMALS = {"price": 2}
+PRICER_DEFAULT_DECIMALS = 4
+
+PricerKey = Tuple[str, str, float, str, str]
+
+# LRU: key -> result
+_memo: "OrderedDict[PricerKey, Any]" = OrderedDict()
+# requests en vuelo: key -> task
+_inflight: Dict[PricerKey, asyncio.Task] = {}
+_stats = {"memo_hits": 0, "scheduler_hits": 0, "coalesced": 0, "upstream": 0}
+
+
+def _round_value(target: str, value: float) -> float:
+    return round(float(value), PRICER_VALUE_DECIMALS.get(target, PRICER_DEFAULT_DECIMALS))
+
+
+def _memo_get(key: PricerKey) -> Optional[Any]:
+    res = _memo.get(key)
+    if res is not None:
+        _memo.move_to_end(key)
+    return res
+
+
+def _memo_put(key: PricerKey, res: Any) -> None:
+    _memo[key] = res
+    _memo.move_to_end(key)
+    while len(_memo) > PRICER_MEMO_MAX:
+        _memo.popitem(last=False)
+
+
+def _from_scheduler(key: PricerKey) -> Optional[Any]:
+    """
+    Reusa la grilla de escenarios del daily pack si coincide exactamente la key.
+    La entrada vencida también sirve: operation_date ya garantiza que es del día.
+    """
+    ticker, target, value, settlement_entry, operation_date = key
+    if target != "price":
+        return None
+
+    entry = (cache_get_stale(CACHE_KEYS.DOCTA_PRICER) or {}).get("data", {}).get(ticker)
+    if not entry:
+        return None
+    if entry.get("operation_date") != operation_date or entry.get("settlement_entry") != settlement_entry:
+        return None
+
+    for sc in entry.get("scenarios") or []:
+        res = sc.get("result")
+        if res is None or sc.get("input_dirty_price") is None or (isinstance(res, dict) and res.get("error")):
+            continue
+        if _round_value(target, sc.get("input_dirty_price")) == value:
+            return res
+    return None
+
+
+async def _fetch(key: PricerKey) -> Optional[Any]:
+    ticker, target, value, settlement_entry, operation_date = key
+    token = await get_token()
+    async with docta_sema:
+        _stats["upstream"] += 1
+        res = await docta_post_pricer(
+            token=token,
+            ticker=ticker,
+            target=target,
+            value=value,
+            settlement_entry=settlement_entry,
+            operation_date=operation_date
+        )
+    # sólo memoizamos respuestas válidas
+    if res is not None and not (isinstance(res, dict) and res.get("error")):
+        _memo_put(key, res)
+    return res
+
+
+async def price_on_demand(
+    ticker: str,
+    target: str,
+    value: float,
+    settlement_entry: str = PRICER_SETTLEMENT_ENTRY,
+    operation_date: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Orden de resolución: memo LRU -> escenarios del scheduler -> request en vuelo -> Docta.
+    """
+    ticker = ticker.upper().strip()
+    if not ticker:
+        raise ValueError("ticker vacío")
+    if not target:
+        raise ValueError("target vacío")
+    if operation_date is None:
+        operation_date = dt.date.today().strftime("%Y-%m-%d")
+    else:
+        try:
+            dt.datetime.strptime(operation_date, "%Y-%m-%d")
+        except ValueError:
+            raise ValueError(f"operation_date inválida: {operation_date}")
+
+    key: PricerKey = (ticker, target, _round_value(target, value), settlement_entry, operation_date)
+    out = {
+        "ticker": ticker,
+        "target": target,
+        "value": key[2],
+        "settlement_entry": settlement_entry,
+        "operation_date": operation_date,
+    }
+
+    res = _memo_get(key)
+    if res is not None:
+        _stats["memo_hits"] += 1
+        return {**out, "source": "memo", "result": res}
+
+    res = _from_scheduler(key)
+    if res is not None:
+        _stats["scheduler_hits"] += 1
+        _memo_put(key, res)
+        return {**out, "source": "scheduler", "result": res}
+
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.create_task(_fetch(key))
+        _inflight[key] = task
+        task.add_done_callback(lambda _t, k=key: _inflight.pop(k, None))
+        source = "docta"
+    else:
+        _stats["coalesced"] += 1
+        source = "coalesced"
+
+    # shield: si un cliente corta, no cancelamos el request compartido
+    res = await asyncio.shield(task)
+    return {**out, "source": source, "result": res}
+
+
+def pricer_stats() -> Dict[str, Any]:
+    return {**_stats, "memo_size": len(_memo), "inflight": len(_inflight)}
@@ -1,16 +1,19 @@
+import time
 import asyncio
 import datetime as dt
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Awaitable, Callable, Optional
 
-from services.cache import cache_set, cache_get, cache_is_fresh, CACHE_KEYS
+from services.cache import cache_set, cache_get, cache_get_stale, cache_is_fresh, CACHE_KEYS
 from services.data912 import fetch_data912
-from services.classify import classify_instrument
-from services.docta_auth import get_access_token
+from services import instruments
+from services import historical_store
+from services.curves import refresh_curves
+from services.docta_models import compact
+from services.docta_client import get_token, docta_call, price_scenarios
 from services.docta_bonds import (
     docta_get_cashflow,
     docta_get_yields_intraday,
-    docta_get_yields_historical,
-    docta_post_pricer
+    docta_get_yields_historical
 )
 
 # ============================
@@ -21,14 +24,20 @@ TTL_YIELDS = 600          # 10 min
 TTL_DAILY = 86400         # 24 hs
 
 # ============================
-# CONTROL DE CONCURRENCIA
+# REINTENTOS (sólo símbolos fallidos)
 # ============================
-DOCTA_MAX_CONCURRENCY = 8  # conservador (y suficiente)
-_sema = asyncio.Semaphore(DOCTA_MAX_CONCURRENCY)
+# Una corrida con errores se guarda igual con su TTL normal (conservando el
+# último dato bueno); los símbolos que fallaron se reintentan solos, con
+# backoff exponencial, hasta la próxima corrida completa.
+RETRY_BASE_SECONDS = 60
+RETRY_MAX_SECONDS = 1800  # 30 min
 
 _task: asyncio.Task | None = None
 _stop_event = asyncio.Event()
 
+# cache key -> {"symbols": [...], "attempt": n, "next_at": epoch}
+_retries: Dict[str, Dict[str, Any]] = {}
+
 async def start_scheduler():
     global _task
     _stop_event.clear()
@@ -47,6 +56,7 @@ async def _run_loop():
     - Market (Data912) cada 2m
     - Yields cada 10m
     - Daily pack (cashflow/historical/pricer) cada 24h
+    - Reintento (con backoff) de los símbolos que fallaron en cada dataset
     """
     # al iniciar, hacemos warmup inmediato
     await _refresh_market()
@@ -71,6 +81,9 @@ async def _run_loop():
                 or not cache_is_fresh(CACHE_KEYS.DOCTA_PRICER)):
                 await _refresh_daily_pack()
 
+            # Reintentos de símbolos fallidos
+            await _retry_failed()
+
         except asyncio.CancelledError:
             break
         except Exception as e:
@@ -90,7 +103,7 @@ async def _refresh_market():
                 if not symbol:
                     continue
 
-                cls = classify_instrument(group, symbol)
+                cls = instruments.classify(group, symbol)
                 out.append({
                     "symbol": symbol,
                     "c": r.get("c"),
@@ -114,20 +127,11 @@ async def _refresh_market():
         }
 
         cache_set(CACHE_KEYS.MARKET_SUMMARY, payload, TTL_MARKET)
+        instruments.save()
         print("✅ Market refreshed:", payload["counts"])
     except Exception as e:
         print("❌ refresh_market error:", str(e))
 
-def _get_docta_config():
-    cfg = cache_get(CACHE_KEYS.DOCTA_CONFIG) or {}
-    return cfg.get("client_id"), cfg.get("client_secret"), cfg.get("scope")
-
-async def _get_token():
-    client_id, client_secret, scope = _get_docta_config()
-    if not client_id or not client_secret:
-        raise RuntimeError("Missing Docta credentials in cache.")
-    return await get_access_token(client_id, client_secret, scope)
-
 def _extract_all_symbols_from_market() -> List[str]:
     m = cache_get(CACHE_KEYS.MARKET_SUMMARY) or {}
     symbols = set()
@@ -141,9 +145,164 @@ def _extract_all_symbols_from_market() -> List[str]:
     # orden estable
     return sorted(symbols)
 
+def market_prices() -> Dict[str, float]:
+    """
+    Precio “c” por símbolo desde el market summary (sólo los parseables).
+    """
+    m = cache_get(CACHE_KEYS.MARKET_SUMMARY) or {}
+    prices: Dict[str, float] = {}
+
+    for group in ["notes", "corp", "bonds"]:
+        for r in (m.get(group) or []):
+            s = (r.get("symbol") or "").upper().strip()
+            c = r.get("c")
+            if not s or s in prices or c is None:
+                continue
+            try:
+                prices[s] = float(c)
+            except (TypeError, ValueError):
+                continue
+    return prices
+
+def _cache_run(key: str, results: Dict[str, Any], ttl: int) -> None:
+    """
+    Guarda una corrida conservando, para los símbolos que fallaron, el último
+    dato bueno, y agenda el reintento de esos símbolos.
+    """
+    prev = (cache_get_stale(key) or {}).get("data") or {}
+    kept = [s for s in results["errors"] if s in prev and s not in results["data"]]
+    for s in kept:
+        results["data"][s] = prev[s]
+    results["stale"] = kept
+
+    cache_set(key, results, ttl)
+    _schedule_retry(key, list(results["errors"]), 1)
+
+def _schedule_retry(key: str, failed: List[str], attempt: int) -> None:
+    if not failed:
+        _retries.pop(key, None)
+        return
+    delay = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (attempt - 1))
+    _retries[key] = {"symbols": failed, "attempt": attempt, "next_at": time.time() + delay}
+
+async def _collect(results: Dict[str, Any], symbols: List[str], fetch: Callable[[str], Awaitable[Any]]) -> None:
+    """
+    fetch(sym) por símbolo: resultado -> data, excepción -> errors, None -> nada.
+    """
+    async def worker(sym: str):
+        try:
+            res = await fetch(sym)
+        except Exception as e:
+            results["errors"][sym] = str(e)
+            return
+        if res is not None:
+            results["data"][sym] = res
+
+    await asyncio.gather(*(worker(s) for s in symbols))
+
+async def _fetch_yield(token: str, sym: str) -> Optional[Any]:
+    y = await docta_call(lambda: docta_get_yields_intraday(token, sym, hedge=True))
+    return None if y is None else compact(y)
+
+async def _fetch_cashflow(token: str, sym: str) -> Optional[Any]:
+    cf = await docta_call(lambda: docta_get_cashflow(token, sym, nominal_units=100.0))
+    return None if cf is None else compact(cf)
+
+async def _fetch_historical(token: str, sym: str, from_date: str, to_date: str) -> Optional[Dict[str, Any]]:
+    h = await docta_call(lambda: docta_get_yields_historical(token, sym, from_date=from_date, to_date=to_date))
+    if h is None:
+        return None
+    if isinstance(h, dict) and h.get("error"):
+        raise RuntimeError(h.get("detail") or h["error"])
+    # persistimos en disco (fuera del event loop); en cache sólo queda la meta
+    return await asyncio.to_thread(historical_store.write_symbol, sym, h)
+
+async def _fetch_pricer(token: str, sym: str, prices: Dict[str, float], operation_date: str) -> Optional[Dict[str, Any]]:
+    px = prices.get(sym)
+    if px is None:
+        return None
+    return await docta_call(lambda: price_scenarios(token, sym, px, operation_date))
+
+def _fetcher(key: str, token: str, entry: Dict[str, Any]) -> Callable[[str], Awaitable[Any]]:
+    """
+    fetch(sym) de un dataset, para reintentar sus símbolos fallidos.
+    """
+    if key == CACHE_KEYS.DOCTA_YIELDS:
+        return lambda sym: _fetch_yield(token, sym)
+    if key == CACHE_KEYS.DOCTA_CASHFLOWS:
+        return lambda sym: _fetch_cashflow(token, sym)
+    if key == CACHE_KEYS.DOCTA_HISTORICAL:
+        from_date, to_date = entry["from_date"], entry["to_date"]
+        return lambda sym: _fetch_historical(token, sym, from_date, to_date)
+    if key == CACHE_KEYS.DOCTA_PRICER:
+        prices = market_prices()
+        operation_date = dt.date.today().strftime("%Y-%m-%d")
+        return lambda sym: _fetch_pricer(token, sym, prices, operation_date)
+    raise ValueError(f"Dataset sin reintento: {key}")
+
+async def _retry_failed():
+    """
+    Reintenta sólo los símbolos fallidos de cada dataset cuyo backoff venció
+    y los incorpora a la corrida cacheada (sin tocar su TTL).
+    """
+    now = time.time()
+    due = [k for k, r in _retries.items() if r["next_at"] <= now]
+    if not due:
+        return
+
+    try:
+        token = await get_token()
+    except Exception as e:
+        print("❌ retry_failed error:", str(e))
+        for key in due:
+            r = _retries[key]
+            _schedule_retry(key, r["symbols"], r["attempt"] + 1)
+        return
+
+    touched = set()
+    for key in due:
+        r = _retries[key]
+        entry = cache_get_stale(key)
+        if entry is None:
+            _retries.pop(key, None)
+            continue
+
+        results: Dict[str, Any] = {"data": {}, "errors": {}}
+        try:
+            await _collect(results, r["symbols"], _fetcher(key, token, entry))
+        except Exception as e:
+            print(f"❌ retry {key} error:", str(e))
+            _schedule_retry(key, r["symbols"], r["attempt"] + 1)
+            continue
+
+        # los que ya no fallan salen de errors / stale; si ahora dan 404,
+        # se descarta también el dato viejo que se había conservado
+        stale = set(entry.get("stale") or [])
+        for s in r["symbols"]:
+            if s in results["errors"]:
+                continue
+            entry["errors"].pop(s, None)
+            if s not in results["data"] and s in stale:
+                entry["data"].pop(s, None)
+        entry["errors"].update(results["errors"])
+        entry["data"].update(results["data"])
+        entry["stale"] = [s for s in entry.get("stale") or [] if s in results["errors"]]
+
+        _schedule_retry(key, list(results["errors"]), r["attempt"] + 1)
+        if results["data"]:
+            touched.add(key)
+        print(f"🔁 Retry {key}: ok {len(results['data'])}, errors {len(results['errors'])} (attempt {r['attempt']})")
+
+    if CACHE_KEYS.DOCTA_CASHFLOWS in touched:
+        entry = cache_get_stale(CACHE_KEYS.DOCTA_CASHFLOWS) or {}
+        instruments.enrich_from_cashflows(entry.get("data") or {})
+        instruments.save()
+    if touched & {CACHE_KEYS.DOCTA_YIELDS, CACHE_KEYS.DOCTA_CASHFLOWS}:
+        _refresh_curves()
+
 async def _refresh_yields():
     try:
-        token = await _get_token()
+        token = await get_token()
         symbols = _extract_all_symbols_from_market()
 
         results: Dict[str, Any] = {
@@ -152,21 +311,35 @@ async def _refresh_yields():
             "errors": {}
         }
 
-        async def worker(sym: str):
-            async with _sema:
-                try:
-                    y = await docta_get_yields_intraday(token, sym)
-                    if y is None:
-                        return
-                    results["data"][sym] = y
-                except Exception as e:
-                    results["errors"][sym] = str(e)
-
-        await asyncio.gather(*(worker(s) for s in symbols))
-        cache_set(CACHE_KEYS.DOCTA_YIELDS, results, TTL_YIELDS)
-        print(f"✅ Yields refreshed: {len(results['data'])} tickers (errors {len(results['errors'])})")
+        await _collect(results, symbols, lambda sym: _fetch_yield(token, sym))
+        _cache_run(CACHE_KEYS.DOCTA_YIELDS, results, TTL_YIELDS)
+        print(f"✅ Yields refreshed: {len(results['data'])} tickers (errors {len(results['errors'])}, stale {len(results['stale'])})")
     except Exception as e:
         print("❌ refresh_yields error:", str(e))
+        return
+
+    _refresh_curves()
+
+def _refresh_curves():
+    """
+    Curvas por bucket a partir de yields (TIR) + cashflows (vencimiento).
+    Sólo se reajustan los buckets cuyos bonos cambiaron.
+    """
+    try:
+        out = refresh_curves(
+            cache_get(CACHE_KEYS.MARKET_SUMMARY) or {},
+            cache_get(CACHE_KEYS.DOCTA_YIELDS) or {},
+            cache_get(CACHE_KEYS.DOCTA_CASHFLOWS) or {},
+        )
+        # buckets que esta vez no se pudieron armar: mantenemos la última curva
+        prev = (cache_get_stale(CACHE_KEYS.CURVES) or {}).get("curves") or {}
+        out["stale"] = [bid for bid in prev if bid not in out["curves"]]
+        for bid in out["stale"]:
+            out["curves"][bid] = prev[bid]
+        cache_set(CACHE_KEYS.CURVES, out, TTL_YIELDS)
+        print(f"✅ Curves refreshed: refit {out['refit']}, reused {len(out['reused'])}")
+    except Exception as e:
+        print("❌ refresh_curves error:", str(e))
 
 async def _refresh_daily_pack():
     """
@@ -174,7 +347,7 @@ async def _refresh_daily_pack():
     Todo 1 vez por día.
     """
     try:
-        token = await _get_token()
+        token = await get_token()
         symbols = _extract_all_symbols_from_market()
 
         today = dt.date.today()
@@ -186,89 +359,24 @@ async def _refresh_daily_pack():
         historical: Dict[str, Any] = {"timestamp_utc": dt.datetime.utcnow().isoformat(), "from_date": from_date, "to_date": to_date, "data": {}, "errors": {}}
         pricer: Dict[str, Any] = {"timestamp_utc": dt.datetime.utcnow().isoformat(), "data": {}, "errors": {}}
 
-        market = cache_get(CACHE_KEYS.MARKET_SUMMARY) or {}
-
-        # helper para obtener precio “c” si existe
-        def find_price(sym: str) -> float | None:
-            for group in ["notes", "corp", "bonds"]:
-                for r in (market.get(group) or []):
-                    if (r.get("symbol") or "").upper() == sym.upper():
-                        c = r.get("c")
-                        try:
-                            return float(c) if c is not None else None
-                        except:
-                            return None
-            return None
-
+        prices = market_prices()
         operation_date = today.strftime("%Y-%m-%d")
-        settlement_entry = "24hs"
-
-        # Escenarios prefijados (consistentes)
-        pct_scenarios = [-0.10, -0.05, -0.02, 0.02, 0.05, 0.10]
-
-        async def cashflow_worker(sym: str):
-            async with _sema:
-                try:
-                    cf = await docta_get_cashflow(token, sym, nominal_units=100.0)
-                    if cf is None:
-                        return
-                    cashflows["data"][sym] = cf
-                except Exception as e:
-                    cashflows["errors"][sym] = str(e)
-
-        async def hist_worker(sym: str):
-            async with _sema:
-                try:
-                    h = await docta_get_yields_historical(token, sym, from_date=from_date, to_date=to_date)
-                    if h is None:
-                        return
-                    historical["data"][sym] = h
-                except Exception as e:
-                    historical["errors"][sym] = str(e)
-
-        async def pricer_worker(sym: str):
-            async with _sema:
-                try:
-                    px = find_price(sym)
-                    if px is None:
-                        return
-
-                    # pricer suele usarse más con tickers “D”, pero no lo forzamos
-                    scenarios = []
-                    for p in pct_scenarios:
-                        val = px * (1.0 + p)
-                        res = await docta_post_pricer(
-                            token=token,
-                            ticker=sym,
-                            target="price",
-                            value=float(val),
-                            settlement_entry=settlement_entry,
-                            operation_date=operation_date
-                        )
-                        scenarios.append({
-                            "pct": p,
-                            "input_dirty_price": float(val),
-                            "result": res
-                        })
-
-                    pricer["data"][sym] = {
-                        "base_price": px,
-                        "operation_date": operation_date,
-                        "settlement_entry": settlement_entry,
-                        "scenarios": scenarios
-                    }
-                except Exception as e:
-                    pricer["errors"][sym] = str(e)
 
         # Ejecutamos en tandas para estabilidad
-        await asyncio.gather(*(cashflow_worker(s) for s in symbols))
-        await asyncio.gather(*(hist_worker(s) for s in symbols))
-        await asyncio.gather(*(pricer_worker(s) for s in symbols))
+        await _collect(cashflows, symbols, lambda sym: _fetch_cashflow(token, sym))
+        await _collect(historical, symbols, lambda sym: _fetch_historical(token, sym, from_date, to_date))
+        await _collect(pricer, symbols, lambda sym: _fetch_pricer(token, sym, prices, operation_date))
 
-        cache_set(CACHE_KEYS.DOCTA_CASHFLOWS, cashflows, TTL_DAILY)
-        cache_set(CACHE_KEYS.DOCTA_HISTORICAL, historical, TTL_DAILY)
-        cache_set(CACHE_KEYS.DOCTA_PRICER, pricer, TTL_DAILY)
+        _cache_run(CACHE_KEYS.DOCTA_CASHFLOWS, cashflows, TTL_DAILY)
+        enriched = instruments.enrich_from_cashflows(cashflows["data"])
+        instruments.save()
+        _cache_run(CACHE_KEYS.DOCTA_HISTORICAL, historical, TTL_DAILY)
+        _cache_run(CACHE_KEYS.DOCTA_PRICER, pricer, TTL_DAILY)
 
-        print(f"✅ Daily pack refreshed: cashflows {len(cashflows['data'])}, historical {len(historical['data'])}, pricer {len(pricer['data'])}")
+        print(f"✅ Daily pack refreshed: cashflows {len(cashflows['data'])}, historical {len(historical['data'])}, pricer {len(pricer['data'])}, instruments enriched {enriched}")
     except Exception as e:
         print("❌ refresh_daily_pack error:", str(e))
+        return
+
+    # vencimientos nuevos -> recalculamos curvas
+    _refresh_curves()
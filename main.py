@@ -1,5 +1,15 @@
-from fastapi import FastAPI
+from typing import List, Optional
+
+import httpx
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from pydantic import BaseModel
+
+from services import historical_store, instruments
+from services.cache import cache_get, CACHE_KEYS
+from services.circuit import breakers_status, CircuitOpenError
+from jobs.batch import batch_query
+from jobs.pricer import price_on_demand, pricer_stats
 
 app = FastAPI(
     title="IngeCapital Data API",
@@ -38,5 +48,135 @@ def test_endpoint():
         "service": "ingecapital-data-api"
     }
 
+# ============================
+# ESTADO UPSTREAM (circuit breakers Docta)
+# ============================
+@app.get("/health/docta")
+def docta_health():
+    return {"breakers": breakers_status()}
+
+# ============================
+# HISTÓRICOS (store en disco)
+# ============================
+@app.get("/historical")
+def historical_symbols():
+    symbols = historical_store.list_symbols()
+    return {"count": len(symbols), "symbols": symbols}
+
+@app.get("/historical/{symbol}")
+def historical_query(
+    symbol: str,
+    from_date: Optional[str] = None,
+    to_date: Optional[str] = None,
+    freq: str = "D",
+    fields: Optional[str] = None
+):
+    """
+    freq: D | W | M
+    fields: lista separada por comas (ej: "ytm,price")
+    """
+    field_list = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    try:
+        out = historical_store.query_symbol(symbol, from_date, to_date, freq, field_list)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if out is None:
+        raise HTTPException(status_code=404, detail=f"Sin histórico para {symbol.upper()}")
+    return out
+
+# ============================
+# BATCH (yields / cashflows / pricer)
+# ============================
+class BatchRequest(BaseModel):
+    symbols: List[str]
+    datasets: List[str] = ["yields", "cashflows", "pricer"]
+    fields: Optional[List[str]] = None
+    fetch_missing: bool = True
+
+@app.post("/batch")
+async def batch_endpoint(req: BatchRequest):
+    try:
+        return await batch_query(req.symbols, req.datasets, req.fields, req.fetch_missing)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# ============================
+# PRICER ON-DEMAND
+# ============================
+@app.get("/pricer/stats")
+def pricer_stats_endpoint():
+    return pricer_stats()
+
+@app.get("/pricer/{ticker}")
+async def pricer_endpoint(
+    ticker: str,
+    value: float,
+    target: str = "price",
+    settlement_entry: str = "24hs",
+    operation_date: Optional[str] = None
+):
+    """
+    operation_date: YYYY-MM-DD (default hoy)
+    """
+    try:
+        out = await price_on_demand(ticker, target, value, settlement_entry, operation_date)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except CircuitOpenError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(max(1, int(e.retry_after)))}
+        )
+    except (httpx.HTTPError, RuntimeError) as e:
+        # upstream caído / timeout / sin credenciales Docta
+        raise HTTPException(status_code=502, detail=f"Docta pricer error: {e}")
+
+    res = out["result"]
+    if res is None:
+        raise HTTPException(status_code=404, detail=f"Pricer sin resultado para {out['ticker']}")
+    if isinstance(res, dict) and res.get("error"):
+        raise HTTPException(status_code=422, detail=res)
+    return out
+
+# ============================
+# CURVAS (Nelson–Siegel por bucket)
+# ============================
+@app.get("/curves")
+def curves_list():
+    c = cache_get(CACHE_KEYS.CURVES) or {}
+    curves = c.get("curves") or {}
+    return {
+        "timestamp_utc": c.get("timestamp_utc"),
+        "buckets": {bid: {"n_points": cv["n_points"], "params": cv["params"]} for bid, cv in curves.items()}
+    }
+
+@app.get("/curves/{bucket}")
+def curves_bucket(bucket: str):
+    """
+    bucket: ej BONO_USD_USD, BONO_CER_ARS, LECAP_LETRA_ARS, ON_USD
+    """
+    c = cache_get(CACHE_KEYS.CURVES) or {}
+    curve = (c.get("curves") or {}).get(bucket.upper())
+    if curve is None:
+        raise HTTPException(status_code=404, detail=f"Sin curva para {bucket.upper()}")
+    return {"timestamp_utc": c.get("timestamp_utc"), **curve}
 
+# ============================
+# REGISTRO DE INSTRUMENTOS
+# ============================
+@app.get("/instruments")
+def instruments_list(asset_type: Optional[str] = None, currency: Optional[str] = None):
+    out = {
+        sym: info for sym, info in instruments.all_instruments().items()
+        if (asset_type is None or info.get("asset_type") == asset_type.upper())
+        and (currency is None or info.get("currency") == currency.upper())
+    }
+    return {"count": len(out), "instruments": out}
 
+@app.get("/instruments/{symbol}")
+def instruments_get(symbol: str):
+    info = instruments.get(symbol)
+    if info is None:
+        raise HTTPException(status_code=404, detail=f"Instrumento desconocido: {symbol.upper()}")
+    return {"symbol": symbol.upper(), **info}
@@ -16,6 +16,8 @@ class CACHE_KEYS:
     DOCTA_HISTORICAL = "docta_historical"
     DOCTA_PRICER = "docta_pricer"
 
+    CURVES = "curves"
+
 def cache_set(key: str, value: Any, ttl_seconds: int) -> None:
     _CACHE[key] = {"value": value, "expires_at": time.time() + ttl_seconds}
 
@@ -27,6 +29,13 @@ def cache_get(key: str) -> Optional[Any]:
         return None
     return item["value"]
 
+def cache_get_stale(key: str) -> Optional[Any]:
+    """
+    Último valor guardado aunque haya vencido (para no perder datos buenos).
+    """
+    item = _CACHE.get(key)
+    return item["value"] if item else None
+
 def cache_is_fresh(key: str) -> bool:
     item = _CACHE.get(key)
     return bool(item) and time.time() <= item["expires_at"]
@@ -0,0 +1,205 @@
+import time
+import asyncio
+from collections import deque
+
+import httpx
+from typing import Dict, Any, Awaitable, Callable, Deque, Optional, TypeVar
+
+T = TypeVar("T")
+
+# ============================
+# CIRCUIT BREAKER POR ENDPOINT
+# ============================
+# closed    -> pasa todo; N fallas seguidas -> open
+# open      -> falla rápido (CircuitOpenError) durante COOLDOWN
+# half_open -> deja pasar una sola sonda; ok -> closed, falla -> open
+# Sólo cuentan como falla los errores del upstream (timeout, transporte, 5xx, 429).
+# Un 4xx por símbolo (ticker no soportado) es una respuesta válida de un
+# upstream sano: no debe abrir el circuito para todo el universo.
+FAILURE_THRESHOLD = 5
+COOLDOWN_SECONDS = 30.0
+
+
+# con sonda en vuelo, cuánto esperar antes de reintentar
+PROBE_RETRY_SECONDS = 1.0
+
+# Hedging: a lo sumo HEDGE_BUDGET de las llamadas recientes, nunca más de
+# HEDGE_MAX_INFLIGHT segundos intentos a la vez (van por fuera del semáforo
+# de Docta), y nada de hedging con fallas recientes en el endpoint.
+HEDGE_BUDGET = 0.05
+HEDGE_WINDOW = 200
+HEDGE_MAX_INFLIGHT = 2
+HEDGE_QUIET_SECONDS = 60.0
+
+
+class CircuitOpenError(RuntimeError):
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        # segundos hasta que el circuito vuelva a dejar pasar una llamada
+        self.retry_after = retry_after
+
+
+def is_upstream_failure(e: BaseException) -> bool:
+    if isinstance(e, httpx.HTTPStatusError):
+        code = e.response.status_code
+        return code >= 500 or code == 429
+    return isinstance(e, (httpx.TimeoutException, httpx.TransportError, asyncio.TimeoutError))
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int = FAILURE_THRESHOLD, cooldown: float = COOLDOWN_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.last_failure_at = 0.0
+        self._probe_in_flight = False
+        # por cada llamada hedgeable: True si se lanzó el segundo intento
+        self.hedge_log: Deque[bool] = deque(maxlen=HEDGE_WINDOW)
+        # latencias (s) de llamadas exitosas, para el umbral de hedging
+        self.latencies: Deque[float] = deque(maxlen=200)
+
+    def _before_call(self) -> bool:
+        """
+        Devuelve True si esta llamada es la sonda de half_open.
+        """
+        if self.state == "open":
+            remaining = self.cooldown - (time.time() - self.opened_at)
+            if remaining > 0:
+                raise CircuitOpenError(f"Circuit '{self.name}' abierto", remaining)
+            self.state = "half_open"
+
+        if self.state == "half_open":
+            if self._probe_in_flight:
+                raise CircuitOpenError(f"Circuit '{self.name}' probando recuperación", PROBE_RETRY_SECONDS)
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def _on_success(self, elapsed: Optional[float] = None) -> None:
+        self.state = "closed"
+        self.failures = 0
+        if elapsed is not None:
+            self.latencies.append(elapsed)
+
+    def _on_failure(self) -> None:
+        self.failures += 1
+        self.last_failure_at = time.time()
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                print(f"⚠️ Circuit '{self.name}' abierto ({self.failures} fallas)")
+            self.state = "open"
+            self.opened_at = time.time()
+
+    async def call(self, fn: Callable[[], Awaitable[T]]) -> T:
+        probe = self._before_call()
+        start = time.monotonic()
+        try:
+            res = await fn()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if is_upstream_failure(e):
+                self._on_failure()
+            else:
+                # el upstream respondió (ej. 4xx de un símbolo): no es falla del endpoint
+                self._on_success()
+            raise
+        else:
+            self._on_success(time.monotonic() - start)
+            return res
+        finally:
+            if probe:
+                self._probe_in_flight = False
+
+    def latency_quantile(self, q: float) -> Optional[float]:
+        if len(self.latencies) < 20:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def can_hedge(self) -> bool:
+        if self.state != "closed" or self.failures:
+            return False
+        if time.time() - self.last_failure_at < HEDGE_QUIET_SECONDS:
+            return False
+        return sum(self.hedge_log) < HEDGE_BUDGET * max(len(self.hedge_log), 1)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "opened_at": self.opened_at or None,
+            "p95_latency": self.latency_quantile(0.95),
+            "hedged_recent": sum(self.hedge_log),
+        }
+
+
+_BREAKERS: Dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    b = _BREAKERS.get(name)
+    if b is None:
+        b = _BREAKERS[name] = CircuitBreaker(name)
+    return b
+
+
+_hedges_inflight = 0
+
+
+def breakers_status() -> Dict[str, Any]:
+    return {name: b.snapshot() for name, b in _BREAKERS.items()}
+
+
+# ============================
+# HEDGED REQUESTS
+# ============================
+async def hedged(fn: Callable[[], Awaitable[T]], breaker: CircuitBreaker, quantile: float = 0.95) -> T:
+    """
+    Lanza fn(); si no respondió pasado el cuantil de latencia del endpoint,
+    lanza un segundo intento y se queda con el primero que termine bien.
+    Sin historia suficiente de latencias, es una llamada simple. El segundo
+    intento respeta el presupuesto de hedging (ver HEDGE_*).
+    """
+    global _hedges_inflight
+    threshold = breaker.latency_quantile(quantile)
+    if threshold is None:
+        return await breaker.call(fn)
+
+    first = asyncio.ensure_future(breaker.call(fn))
+    pending = {first}
+    hedging = False
+    try:
+        done, _ = await asyncio.wait(pending, timeout=threshold)
+        if done:
+            breaker.hedge_log.append(False)
+            return first.result()
+
+        if not breaker.can_hedge() or _hedges_inflight >= HEDGE_MAX_INFLIGHT:
+            breaker.hedge_log.append(False)
+            return await first
+
+        breaker.hedge_log.append(True)
+        hedging = True
+        _hedges_inflight += 1
+
+        # si el circuito no deja pasar el segundo intento, éste falla rápido y seguimos con el primero
+        pending.add(asyncio.ensure_future(breaker.call(fn)))
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for t in done:
+                if t.exception() is None:
+                    return t.result()
+                if error is None or isinstance(error, CircuitOpenError):
+                    error = t.exception()
+        raise error
+    finally:
+        if hedging:
+            _hedges_inflight -= 1
+        for t in pending:
+            if not t.done():
+                t.cancel()
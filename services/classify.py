@@ -1,4 +1,32 @@
-from typing import Dict, Any
+import re
+from typing import Dict, Any, List, Tuple
+
+# ============================
+# TABLA DE REGLAS
+# ============================
+# (group, regex sobre el símbolo, asset_type, currency) — gana la primera que matchea.
+# Sufijos BYMA: D = dólar MEP, C = dólar cable. Una "C" en el medio del
+# símbolo no dice nada (ej. AE38C es AE38 en cable, no CER).
+# Para excepciones puntuales usar el override de services/instruments.py.
+_CER = r"(TX\d{2}|TZX[A-Z]?\d{1,2}|T\dX\d|TC\d{2}P?|DICP|PARP|CUAP|DIP0|PAP0)"
+
+RULES: List[Tuple[str, str, str, str]] = [
+    ("notes", r".*", "LECAP/LETRA", "ARS"),
+
+    ("corp", r".*[DC]$", "ON", "USD"),
+    ("corp", r".*", "ON", "ARS"),
+
+    # CER: Boncer (TX26, TZX26, TZXD5/TZXM6 con letra de mes, T2X5/T4X4, TC23, TC25P)
+    # y discount/par/cuasipar en pesos. Con sufijo D/C es la línea en dólares.
+    ("bonds", _CER + r"[DC]", "BONO_CER", "USD"),
+    ("bonds", _CER, "BONO_CER", "ARS"),
+    # hard dollar (MEP / cable)
+    ("bonds", r".*[DC]$", "BONO_USD", "USD"),
+    ("bonds", r".*", "BONO_ARS", "ARS"),
+]
+
+_COMPILED = [(g, re.compile(rx), at, cur) for g, rx, at, cur in RULES]
+
 
 def classify_instrument(group: str, symbol: str) -> Dict[str, Any]:
     """
@@ -6,28 +34,8 @@ def classify_instrument(group: str, symbol: str) -> Dict[str, Any]:
     """
     s = symbol.upper().strip()
 
-    if group == "notes":
-        return {"asset_type": "LECAP/LETRA", "currency": "ARS", "group": "notes"}
-
-    if group == "corp":
-        # ONs: si termina en D -> USD (según tu criterio)
-        if s.endswith("D"):
-            return {"asset_type": "ON", "currency": "USD", "group": "corp"}
-        return {"asset_type": "ON", "currency": "ARS", "group": "corp"}
-
-    if group == "bonds":
-        # Heurística:
-        # - termina en D -> especie USD
-        # - contiene C -> CER (ej AE38C)
-        # - sino -> ARS “común”
-        if "C" in s and not s.endswith("D"):
-            return {"asset_type": "BONO_CER", "currency": "ARS", "group": "bonds"}
-        if "C" in s and s.endswith("D"):
-            return {"asset_type": "BONO_CER", "currency": "USD", "group": "bonds"}
-
-        if s.endswith("D"):
-            return {"asset_type": "BONO_USD", "currency": "USD", "group": "bonds"}
-
-        return {"asset_type": "BONO_ARS", "currency": "ARS", "group": "bonds"}
+    for g, rx, asset_type, currency in _COMPILED:
+        if g == group and rx.fullmatch(s):
+            return {"asset_type": asset_type, "currency": currency, "group": group}
 
     return {"asset_type": "UNKNOWN", "currency": "UNKNOWN", "group": group}
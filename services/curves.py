@@ -0,0 +1,233 @@
+import datetime as dt
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+from services import instruments
+from services.docta_models import DoctaTable, CASHFLOW_DATE_KEYS, extract_rows, to_date, to_float
+
+# ============================
+# CURVAS NELSON–SIEGEL POR BUCKET
+# ============================
+# y(t) = b0 + b1 * f1(t/λ) + b2 * f2(t/λ)
+#   f1(x) = (1 - e^-x) / x
+#   f2(x) = f1(x) - e^-x
+# Para λ fijo el ajuste es lineal en (b0, b1, b2): resolvemos todos los λ
+# de la grilla juntos (ecuaciones normales batcheadas) y nos quedamos con
+# el de menor SSE.
+NS_LAMBDA_GRID = np.linspace(0.25, 10.0, 40)
+NS_MIN_POINTS = 4
+
+# buckets que tiene sentido ajustar (asset_type de classify_instrument).
+# BONO_ARS queda afuera: mezcla las líneas en pesos de bonos hard dollar
+# (AL30, GD30) con bonos a tasa fija en pesos, y esa curva no significa nada.
+CURVE_ASSET_TYPES = ("BONO_USD", "BONO_CER", "LECAP/LETRA", "ON")
+
+# una sola línea de liquidación por bono: preferimos MEP (D) sobre cable (C)
+SETTLEMENT_PREFERENCE = {"D": 0, "C": 1}
+
+YIELD_KEYS = ("ytm", "tir", "yield", "irr")
+MATURITY_KEYS = ("maturity", "maturity_date", "vencimiento")
+
+# bucket_id -> {"signature": ..., "curve": ...}
+_fits: Dict[str, Dict[str, Any]] = {}
+
+
+def bucket_id(asset_type: str, currency: str) -> str:
+    return f"{asset_type}_{currency}".replace("/", "_")
+
+
+def _underlying(sym: str, currency: Optional[str]) -> Tuple[str, int]:
+    """
+    (bono subyacente, preferencia de la línea). GD30D / GD30C -> GD30.
+    """
+    if currency == "USD" and len(sym) > 1 and sym[-1] in SETTLEMENT_PREFERENCE:
+        return sym[:-1], SETTLEMENT_PREFERENCE[sym[-1]]
+    return sym, 0
+
+
+def _records(payload: Any) -> List[Dict[str, Any]]:
+    # un dict sin filas se trata como una única fila (ej. {"ytm": ...})
+    rows = extract_rows(payload)
+    if not rows and isinstance(payload, dict):
+        return [payload]
+    return rows
+
+
+def extract_last_yield(payload: Any) -> Optional[float]:
+    """
+    Último valor de TIR disponible en el payload intradiario de Docta.
+    """
+    if isinstance(payload, DoctaTable):
+        return payload.last_number(YIELD_KEYS)
+    for r in reversed(_records(payload)):
+        for k in YIELD_KEYS:
+            y = to_float(r.get(k))
+            if y is not None:
+                return y
+    return None
+
+
+def extract_maturity(yields_payload: Any, cashflow_payload: Any) -> Optional[dt.date]:
+    """
+    Vencimiento explícito si Docta lo informa; si no, último pago del cashflow.
+    """
+    for payload in (yields_payload, cashflow_payload):
+        meta = payload.meta if isinstance(payload, DoctaTable) else payload
+        if isinstance(meta, dict):
+            for k in MATURITY_KEYS:
+                d = to_date(meta.get(k))
+                if d:
+                    return d
+
+    if isinstance(cashflow_payload, DoctaTable):
+        for k in CASHFLOW_DATE_KEYS:
+            col = cashflow_payload.column(k)
+            if col is not None:
+                dates = [d for d in map(to_date, col) if d]
+                if dates:
+                    return max(dates)
+        return None
+
+    dates = []
+    for r in _records(cashflow_payload):
+        for k in CASHFLOW_DATE_KEYS:
+            d = to_date(r.get(k))
+            if d:
+                dates.append(d)
+                break
+    return max(dates) if dates else None
+
+
+def _ns_basis(t: np.ndarray, lam: np.ndarray) -> np.ndarray:
+    """
+    t: (n,), lam: (L,) -> X: (L, n, 3)
+    """
+    x = t[None, :] / lam[:, None]
+    ex = np.exp(-x)
+    f1 = (1.0 - ex) / x
+    f2 = f1 - ex
+    return np.stack([np.ones_like(x), f1, f2], axis=-1)
+
+
+def fit_nelson_siegel(t: np.ndarray, y: np.ndarray) -> Dict[str, Any]:
+    X = _ns_basis(t, NS_LAMBDA_GRID)                     # (L, n, 3)
+    Xt = np.swapaxes(X, 1, 2)                            # (L, 3, n)
+    # ridge mínimo para que λ degenerados no rompan el solve
+    XtX = Xt @ X + 1e-10 * np.eye(3)
+    Xty = Xt @ y                                         # (L, 3)
+    betas = np.linalg.solve(XtX, Xty[..., None])[..., 0] # (L, 3)
+    resid = y[None, :] - np.einsum("lnk,lk->ln", X, betas)
+    sse = (resid ** 2).sum(axis=1)
+
+    best = int(np.argmin(sse))
+    return {
+        "beta0": float(betas[best, 0]),
+        "beta1": float(betas[best, 1]),
+        "beta2": float(betas[best, 2]),
+        "lambda": float(NS_LAMBDA_GRID[best]),
+        "rmse": float(np.sqrt(sse[best] / t.size)),
+    }
+
+
+def ns_eval(params: Dict[str, Any], t: np.ndarray) -> np.ndarray:
+    X = _ns_basis(np.asarray(t, dtype=np.float64), np.array([params["lambda"]]))[0]
+    return X @ np.array([params["beta0"], params["beta1"], params["beta2"]])
+
+
+def collect_points(
+    market: Dict[str, Any],
+    yields: Dict[str, Any],
+    cashflows: Dict[str, Any],
+    today: Optional[dt.date] = None
+) -> Dict[str, List[Tuple[str, float, float]]]:
+    """
+    bucket_id -> [(symbol, años a vencimiento, ytm)], un punto por bono subyacente.
+    """
+    today = today or dt.date.today()
+    y_data = (yields or {}).get("data") or {}
+    cf_data = (cashflows or {}).get("data") or {}
+
+    # bucket_id -> subyacente -> (preferencia, punto)
+    chosen: Dict[str, Dict[str, Tuple[int, Tuple[str, float, float]]]] = {}
+    seen = set()
+    for group in ["notes", "corp", "bonds"]:
+        for r in (market.get(group) or []):
+            sym = r.get("symbol")
+            if not sym or sym in seen or r.get("asset_type") not in CURVE_ASSET_TYPES:
+                continue
+            seen.add(sym)
+
+            ytm = extract_last_yield(y_data.get(sym))
+            if ytm is None:
+                continue
+            mat = extract_maturity(y_data.get(sym), cf_data.get(sym))
+            if mat is None:
+                # fallback: vencimiento persistido en el registro de instrumentos
+                info = instruments.get(sym) or {}
+                mat = to_date(info.get("maturity"))
+            if mat is None or mat <= today:
+                continue
+
+            t = (mat - today).days / 365.25
+            under, pref = _underlying(sym, r.get("currency"))
+            lines = chosen.setdefault(bucket_id(r["asset_type"], r.get("currency")), {})
+            if under not in lines or pref < lines[under][0]:
+                lines[under] = (pref, (sym, t, ytm))
+
+    return {bid: [p for _, p in lines.values()] for bid, lines in chosen.items()}
+
+
+def refresh_curves(market: Dict[str, Any], yields: Dict[str, Any], cashflows: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Reajusta sólo los buckets cuyos puntos cambiaron desde el último ajuste.
+    Devuelve {"curves": {bucket_id: curve}, "refit": [...], "reused": [...]}.
+    """
+    buckets = collect_points(market, yields, cashflows)
+    out: Dict[str, Any] = {
+        "timestamp_utc": dt.datetime.utcnow().isoformat(),
+        "curves": {},
+        "refit": [],
+        "reused": [],
+    }
+
+    for bid, points in buckets.items():
+        points.sort()
+        if len(points) < NS_MIN_POINTS:
+            continue
+
+        # firma redondeada: ruido de punto flotante no dispara refits
+        signature = tuple((s, round(t, 4), round(y, 6)) for s, t, y in points)
+        prev = _fits.get(bid)
+        if prev and prev["signature"] == signature:
+            out["curves"][bid] = prev["curve"]
+            out["reused"].append(bid)
+            continue
+
+        syms = [p[0] for p in points]
+        t = np.array([p[1] for p in points], dtype=np.float64)
+        y = np.array([p[2] for p in points], dtype=np.float64)
+
+        params = fit_nelson_siegel(t, y)
+        fitted = ns_eval(params, t)
+        # spread > 0: rinde más que la curva (barato); < 0: caro
+        spreads = y - fitted
+
+        grid_t = np.linspace(max(t.min(), 0.05), t.max(), 50)
+        curve = {
+            "bucket": bid,
+            "model": "nelson_siegel",
+            "params": params,
+            "n_points": len(points),
+            "curve": [{"years": float(a), "ytm": float(b)} for a, b in zip(grid_t, ns_eval(params, grid_t))],
+            "bonds": [
+                {"symbol": s, "years": float(tt), "ytm": float(yy), "fitted": float(ff), "spread": float(sp)}
+                for s, tt, yy, ff, sp in zip(syms, t, y, fitted, spreads)
+            ],
+        }
+
+        _fits[bid] = {"signature": signature, "curve": curve}
+        out["curves"][bid] = curve
+        out["refit"].append(bid)
+
+    return out
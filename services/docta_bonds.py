@@ -3,26 +3,44 @@ import httpx
 from typing import Dict, Any, List, Optional
 
 from services.docta_auth import get_access_token
+from services.circuit import get_breaker, hedged
 
 DOCTA_BASE = "https://api.doctacapital.com.ar/api/v1"
 
+# Cada endpoint tiene su circuit breaker: si Docta se degrada, fallamos rápido
+# (CircuitOpenError) en vez de esperar el timeout completo en cada símbolo.
+
 async def docta_get_cashflow(token: str, symbol: str, nominal_units: float = 100.0, timeout: float = 20.0) -> Optional[Dict[str, Any]]:
     url = f"{DOCTA_BASE}/bonds/analytics/{symbol.upper()}/cashflow/"
-    async with httpx.AsyncClient(timeout=timeout) as client:
-        r = await client.get(url, params={"nominal_units": nominal_units}, headers={"Authorization": f"Bearer {token}"})
-        if r.status_code == 404:
-            return None
-        r.raise_for_status()
-        return r.json()
 
-async def docta_get_yields_intraday(token: str, symbol: str, timeout: float = 20.0) -> Optional[Dict[str, Any]]:
+    async def _get():
+        async with httpx.AsyncClient(timeout=timeout) as client:
+            r = await client.get(url, params={"nominal_units": nominal_units}, headers={"Authorization": f"Bearer {token}"})
+            if r.status_code == 404:
+                return None
+            r.raise_for_status()
+            return r.json()
+
+    return await get_breaker("cashflow").call(_get)
+
+async def docta_get_yields_intraday(token: str, symbol: str, timeout: float = 20.0, hedge: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    hedge=True: si tarda más que el p95 del endpoint, lanza un segundo intento.
+    """
     url = f"{DOCTA_BASE}/bonds/yields/{symbol.upper()}/intraday"
-    async with httpx.AsyncClient(timeout=timeout) as client:
-        r = await client.get(url, headers={"Authorization": f"Bearer {token}"})
-        if r.status_code == 404:
-            return None
-        r.raise_for_status()
-        return r.json()
+
+    async def _get():
+        async with httpx.AsyncClient(timeout=timeout) as client:
+            r = await client.get(url, headers={"Authorization": f"Bearer {token}"})
+            if r.status_code == 404:
+                return None
+            r.raise_for_status()
+            return r.json()
+
+    breaker = get_breaker("yields_intraday")
+    if hedge:
+        return await hedged(_get, breaker)
+    return await breaker.call(_get)
 
 async def docta_get_yields_historical(
     token: str,
@@ -32,15 +50,19 @@ async def docta_get_yields_historical(
     timeout: float = 30.0
 ) -> Optional[Dict[str, Any]]:
     url = f"{DOCTA_BASE}/bonds/yields/{symbol.upper()}/historical/"
-    async with httpx.AsyncClient(timeout=timeout) as client:
-        r = await client.get(url, params={"from_date": from_date, "to_date": to_date}, headers={"Authorization": f"Bearer {token}"})
-        if r.status_code == 404:
-            return None
-        if r.status_code == 422:
-            # cuando falta o está mal un parámetro
-            return {"error": "validation_error", "detail": r.text}
-        r.raise_for_status()
-        return r.json()
+
+    async def _get():
+        async with httpx.AsyncClient(timeout=timeout) as client:
+            r = await client.get(url, params={"from_date": from_date, "to_date": to_date}, headers={"Authorization": f"Bearer {token}"})
+            if r.status_code == 404:
+                return None
+            if r.status_code == 422:
+                # cuando falta o está mal un parámetro
+                return {"error": "validation_error", "detail": r.text}
+            r.raise_for_status()
+            return r.json()
+
+    return await get_breaker("yields_historical").call(_get)
 
 async def docta_post_pricer(
     token: str,
@@ -60,11 +82,14 @@ async def docta_post_pricer(
         "operation_date": operation_date,
     }
 
-    async with httpx.AsyncClient(timeout=timeout) as client:
-        r = await client.post(url, json=payload, headers={"Authorization": f"Bearer {token}", "Content-Type": "application/json"})
-        if r.status_code == 404:
-            return None
-        if r.status_code == 422:
-            return {"error": "validation_error", "detail": r.text, "request": payload}
-        r.raise_for_status()
-        return r.json()
+    async def _post():
+        async with httpx.AsyncClient(timeout=timeout) as client:
+            r = await client.post(url, json=payload, headers={"Authorization": f"Bearer {token}", "Content-Type": "application/json"})
+            if r.status_code == 404:
+                return None
+            if r.status_code == 422:
+                return {"error": "validation_error", "detail": r.text, "request": payload}
+            r.raise_for_status()
+            return r.json()
+
+    return await get_breaker("pricer").call(_post)
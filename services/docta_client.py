@@ -0,0 +1,85 @@
+import asyncio
+from typing import Dict, Any
+
+from services.cache import cache_get, CACHE_KEYS
+from services.circuit import CircuitOpenError
+from services.docta_auth import get_access_token
+from services.docta_bonds import docta_post_pricer
+
+# ============================
+# ACCESO COMPARTIDO A DOCTA
+# ============================
+# scheduler, batch y pricer on-demand comparten el mismo límite de
+# concurrencia, el mismo token y la misma grilla de escenarios.
+DOCTA_MAX_CONCURRENCY = 8  # conservador (y suficiente)
+docta_sema = asyncio.Semaphore(DOCTA_MAX_CONCURRENCY)
+
+# con el circuito abierto, cada worker espera el cooldown (sin ocupar slot) hasta N veces
+CIRCUIT_MAX_WAITS = 3
+
+# ============================
+# PRICER (escenarios prefijados, consistentes)
+# ============================
+PRICER_PCT_SCENARIOS = [-0.10, -0.05, -0.02, 0.02, 0.05, 0.10]
+PRICER_SETTLEMENT_ENTRY = "24hs"
+
+
+def _get_docta_config():
+    cfg = cache_get(CACHE_KEYS.DOCTA_CONFIG) or {}
+    return cfg.get("client_id"), cfg.get("client_secret"), cfg.get("scope")
+
+
+async def get_token() -> str:
+    client_id, client_secret, scope = _get_docta_config()
+    if not client_id or not client_secret:
+        raise RuntimeError("Missing Docta credentials in cache.")
+    return await get_access_token(client_id, client_secret, scope)
+
+
+async def docta_call(fn):
+    """
+    fn() bajo el semáforo. Si el circuito está abierto esperamos a que vuelva
+    a dejar pasar llamadas y reintentamos, así un corte breve de Docta no
+    hace fallar en milisegundos todos los símbolos que quedaban en cola.
+    """
+    waits = 0
+    while True:
+        try:
+            async with docta_sema:
+                return await fn()
+        except CircuitOpenError as e:
+            waits += 1
+            if waits > CIRCUIT_MAX_WAITS:
+                raise
+            await asyncio.sleep(e.retry_after)
+
+
+async def price_scenarios(token: str, sym: str, px: float, operation_date: str) -> Dict[str, Any]:
+    """
+    Grilla fija de escenarios de precio (PRICER_PCT_SCENARIOS) contra el pricer de Docta.
+    El llamador es quien toma el semáforo.
+    """
+    # pricer suele usarse más con tickers “D”, pero no lo forzamos
+    scenarios = []
+    for p in PRICER_PCT_SCENARIOS:
+        val = px * (1.0 + p)
+        res = await docta_post_pricer(
+            token=token,
+            ticker=sym,
+            target="price",
+            value=float(val),
+            settlement_entry=PRICER_SETTLEMENT_ENTRY,
+            operation_date=operation_date
+        )
+        scenarios.append({
+            "pct": p,
+            "input_dirty_price": float(val),
+            "result": res
+        })
+
+    return {
+        "base_price": px,
+        "operation_date": operation_date,
+        "settlement_entry": PRICER_SETTLEMENT_ENTRY,
+        "scenarios": scenarios
+    }
@@ -0,0 +1,225 @@
+import sys
+import math
+import datetime as dt
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+# ============================
+# PAYLOADS DOCTA COMPACTOS
+# ============================
+# Los JSON de Docta (yields intradiarios, cashflows) son listas de filas
+# homogéneas. En cache los guardamos por columnas:
+#   - numéricas -> np.ndarray (int64 si son todos enteros, si no float64 con NaN;
+#                  en float64 se marcan en `int_masks` las filas que venían como
+#                  int, para que to_json devuelva el JSON tal cual llegó)
+#   - resto     -> tupla de valores, strings internados (fechas repetidas
+#                  entre miles de símbolos ocupan una sola vez)
+# El JSON se reconstruye sólo en el borde de la API (to_json).
+ROWS_KEYS = ("data", "results", "cashflow", "cashflows", "yields", "items")
+# columna de fecha de pago en las filas de cashflow
+CASHFLOW_DATE_KEYS = ("date", "payment_date", "fecha")
+
+
+@dataclass(slots=True)
+class DoctaTable:
+    meta: Dict[str, Any]                # escalares de primer nivel del payload
+    rows_key: Optional[str]             # clave donde venían las filas (None = lista directa)
+    keys: Tuple[str, ...]               # orden original de columnas
+    numbers: Dict[str, np.ndarray]
+    others: Dict[str, Tuple[Any, ...]]
+    n: int
+    int_masks: Dict[str, np.ndarray] = field(default_factory=dict)  # float64: filas que eran int
+
+    def __len__(self) -> int:
+        return self.n
+
+    def column(self, key: str) -> Optional[Any]:
+        col = self.numbers.get(key)
+        return col if col is not None else self.others.get(key)
+
+    def last_number(self, keys: Tuple[str, ...]) -> Optional[float]:
+        """
+        Último valor no nulo de la primera columna numérica de `keys` que tenga datos.
+        """
+        for k in keys:
+            col = self.numbers.get(k)
+            if col is None:
+                continue
+            valid = col[~np.isnan(col)] if col.dtype.kind == "f" else col
+            if valid.size:
+                return float(valid[-1])
+        return None
+
+    def select(self, keys: List[str]) -> "DoctaTable":
+        """
+        Proyección de columnas (y de escalares de meta) sobre `keys`.
+        """
+        wanted = set(keys)
+        return DoctaTable(
+            meta={k: v for k, v in self.meta.items() if k in wanted},
+            rows_key=self.rows_key,
+            keys=tuple(k for k in self.keys if k in wanted),
+            numbers={k: v for k, v in self.numbers.items() if k in wanted},
+            others={k: v for k, v in self.others.items() if k in wanted},
+            n=self.n,
+            int_masks={k: v for k, v in self.int_masks.items() if k in wanted},
+        )
+
+    def rows(self) -> List[Dict[str, Any]]:
+        cols = []
+        for k in self.keys:
+            col = self.numbers.get(k)
+            if col is not None:
+                if col.dtype.kind == "f":
+                    mask = self.int_masks.get(k)
+                    if mask is None:
+                        cols.append([None if np.isnan(v) else v for v in col.tolist()])
+                    else:
+                        cols.append([
+                            None if np.isnan(v) else int(v) if is_int else v
+                            for v, is_int in zip(col.tolist(), mask.tolist())
+                        ])
+                else:
+                    cols.append(col.tolist())
+            else:
+                cols.append(self.others[k])
+        if not cols:
+            return [{} for _ in range(self.n)]
+        return [dict(zip(self.keys, vals)) for vals in zip(*cols)]
+
+    def to_json(self) -> Any:
+        rows = self.rows()
+        if self.rows_key is None:
+            return rows
+        return {**self.meta, self.rows_key: rows}
+
+
+def _is_number(v: Any) -> bool:
+    return isinstance(v, (int, float)) and not isinstance(v, bool)
+
+
+def _intern(v: Any) -> Any:
+    return sys.intern(v) if isinstance(v, str) else v
+
+
+def compact(payload: Any) -> Any:
+    """
+    Convierte un payload Docta en DoctaTable. Si no tiene forma tabular
+    (o las filas no son dicts), se devuelve tal cual.
+    """
+    rows_key = None
+    meta: Dict[str, Any] = {}
+
+    if isinstance(payload, list):
+        rows = payload
+    elif isinstance(payload, dict):
+        rows_key = next((k for k in ROWS_KEYS if isinstance(payload.get(k), list)), None)
+        if rows_key is None:
+            return payload
+        rows = payload[rows_key]
+        meta = {k: v for k, v in payload.items() if k != rows_key}
+    else:
+        return payload
+
+    if not all(isinstance(r, dict) for r in rows):
+        return payload
+
+    keys: List[str] = []
+    seen = set()
+    for r in rows:
+        for k in r:
+            if k not in seen:
+                seen.add(k)
+                keys.append(k)
+
+    numbers: Dict[str, np.ndarray] = {}
+    others: Dict[str, Tuple[Any, ...]] = {}
+    int_masks: Dict[str, np.ndarray] = {}
+    for k in keys:
+        vals = [r.get(k) for r in rows]
+        present = [v for v in vals if v is not None]
+        if present and all(_is_number(v) for v in present):
+            try:
+                if len(present) == len(vals) and all(isinstance(v, int) for v in vals):
+                    numbers[k] = np.array(vals, dtype=np.int64)
+                    continue
+                mask = np.array([isinstance(v, int) for v in vals], dtype=bool)
+                if any(abs(v) > 2 ** 53 for v in present if isinstance(v, int)):
+                    # float64 no los representa exactos: quedan como valores
+                    raise OverflowError
+                numbers[k] = np.array([np.nan if v is None else v for v in vals], dtype=np.float64)
+                if mask.any():
+                    int_masks[k] = mask
+                continue
+            except OverflowError:
+                pass
+        others[k] = tuple(_intern(v) for v in vals)
+
+    return DoctaTable(
+        meta=meta,
+        rows_key=rows_key,
+        keys=tuple(keys),
+        numbers=numbers,
+        others=others,
+        n=len(rows),
+        int_masks=int_masks,
+    )
+
+
+def to_json(value: Any) -> Any:
+    return value.to_json() if isinstance(value, DoctaTable) else value
+
+
+# ============================
+# PARSEO COMPARTIDO
+# ============================
+def extract_rows(payload: Any) -> List[Dict[str, Any]]:
+    """
+    Filas de un payload Docta: lista directa o la primera lista bajo ROWS_KEYS.
+    """
+    if isinstance(payload, DoctaTable):
+        return payload.rows()
+    if isinstance(payload, list):
+        return [r for r in payload if isinstance(r, dict)]
+    if isinstance(payload, dict):
+        for k in ROWS_KEYS:
+            v = payload.get(k)
+            if isinstance(v, list):
+                return [r for r in v if isinstance(r, dict)]
+    return []
+
+
+def to_float(v: Any) -> Optional[float]:
+    """
+    float finito o None (bools, strings no numéricos, NaN/inf).
+    """
+    if v is None or isinstance(v, bool):
+        return None
+    try:
+        f = float(v)
+    except (TypeError, ValueError):
+        return None
+    return f if math.isfinite(f) else None
+
+
+def to_date(v: Any) -> Optional[dt.date]:
+    """
+    Fecha desde ISO (se usan los primeros 10 caracteres) o epoch numérico
+    (segundos, o milisegundos si es muy grande).
+    """
+    if v is None or isinstance(v, bool):
+        return None
+    if isinstance(v, (int, float, np.integer, np.floating)):
+        if not math.isfinite(v):
+            return None
+        secs = v / 1000.0 if abs(v) > 1e11 else v
+        try:
+            return dt.datetime.fromtimestamp(secs, dt.timezone.utc).date()
+        except (OverflowError, OSError, ValueError):
+            return None
+    try:
+        return dt.date.fromisoformat(str(v)[:10])
+    except ValueError:
+        return None
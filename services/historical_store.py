@@ -0,0 +1,240 @@
+import os
+import re
+import json
+import time
+import shutil
+import datetime as dt
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+from services.docta_models import extract_rows, to_float, to_date as _to_pydate
+
+# ============================
+# STORE COLUMNAR DE HISTÓRICOS
+# ============================
+# Un directorio por símbolo, con versiones inmutables:
+#   <STORE_DIR>/<SYMBOL>/CURRENT                -> nombre de la versión vigente
+#   <STORE_DIR>/<SYMBOL>/<version>/dates.npy    -> datetime64[D] ordenado
+#   <STORE_DIR>/<SYMBOL>/<version>/<field>.npy  -> float64 (NaN si falta)
+#   <STORE_DIR>/<SYMBOL>/<version>/meta.json    -> campos, filas, rango
+# Una escritura crea una versión nueva y cambia CURRENT con os.replace; un
+# lector que ya resolvió su versión la sigue leyendo entera (guardamos la
+# anterior). Se lee con mmap, así que sólo se trae a memoria el slice pedido.
+STORE_DIR = os.environ.get("HISTORICAL_STORE_DIR", os.path.join("data", "historical"))
+
+DATE_KEYS = ("date", "fecha", "operation_date", "datetime", "timestamp")
+
+# W = semanal, M = mensual (último dato de cada período)
+RESAMPLE_UNITS = {"W": "W", "M": "M"}
+
+CURRENT_FILE = "CURRENT"
+# versiones a conservar (la vigente + la anterior, para lectores en curso)
+KEEP_VERSIONS = 2
+
+# símbolos y campos terminan siendo nombres de archivo
+_SAFE_NAME = re.compile(r"[A-Za-z0-9_]+")
+
+
+def _symbol_dir(symbol: str) -> str:
+    s = symbol.upper().strip()
+    if not _SAFE_NAME.fullmatch(s):
+        raise ValueError(f"Símbolo inválido: {symbol}")
+    return os.path.join(STORE_DIR, s)
+
+
+def _parse_date(v: Any) -> Optional[np.datetime64]:
+    d = _to_pydate(v)
+    return np.datetime64(d, "D") if d is not None else None
+
+
+def _to_float(v: Any) -> float:
+    f = to_float(v)
+    return np.nan if f is None else f
+
+
+def write_symbol(symbol: str, payload: Any) -> Optional[Dict[str, Any]]:
+    """
+    Normaliza el JSON histórico de Docta a columnas y lo persiste.
+    Devuelve la meta escrita, o None si el payload no tiene filas.
+    """
+    rows = extract_rows(payload)
+
+    date_key = None
+    if rows:
+        date_key = next((k for k in DATE_KEYS if k in rows[0]), None)
+    if date_key is None:
+        return None
+
+    parsed = []
+    for r in rows:
+        d = _parse_date(r.get(date_key))
+        if d is not None:
+            parsed.append((d, r))
+    if not parsed:
+        return None
+
+    # campos numéricos: cualquier clave que parsee como float en alguna fila
+    fields: List[str] = []
+    for _, r in parsed:
+        for k, v in r.items():
+            if k == date_key or k in fields or k == "dates" or not _SAFE_NAME.fullmatch(str(k)):
+                continue
+            if not np.isnan(_to_float(v)):
+                fields.append(k)
+
+    dates = np.array([d for d, _ in parsed], dtype="datetime64[D]")
+    order = np.argsort(dates, kind="stable")
+    dates = dates[order]
+
+    # fechas repetidas: nos quedamos con la última fila de cada día
+    last = np.append(dates[1:] != dates[:-1], True)
+    order = order[last]
+    dates = dates[last]
+
+    columns = {}
+    for f in fields:
+        col = np.array([_to_float(r.get(f)) for _, r in parsed], dtype=np.float64)
+        columns[f] = col[order]
+
+    sym_dir = _symbol_dir(symbol)
+    version = f"v{time.time_ns()}"
+    version_dir = os.path.join(sym_dir, version)
+    os.makedirs(version_dir, exist_ok=True)
+
+    np.save(os.path.join(version_dir, "dates.npy"), dates)
+    for f, col in columns.items():
+        np.save(os.path.join(version_dir, f"{f}.npy"), col)
+
+    meta = {
+        "symbol": symbol.upper().strip(),
+        "fields": fields,
+        "rows": int(dates.size),
+        "from_date": str(dates[0]),
+        "to_date": str(dates[-1]),
+        "written_utc": dt.datetime.utcnow().isoformat(),
+    }
+    with open(os.path.join(version_dir, "meta.json"), "w") as fh:
+        json.dump(meta, fh)
+
+    # swap atómico del puntero
+    tmp = os.path.join(sym_dir, CURRENT_FILE + ".tmp")
+    with open(tmp, "w") as fh:
+        fh.write(version)
+    os.replace(tmp, os.path.join(sym_dir, CURRENT_FILE))
+
+    # limpieza de versiones viejas (nombres v<ns>: orden lexicográfico == cronológico)
+    versions = sorted(d for d in os.listdir(sym_dir) if d.startswith("v"))
+    for old in versions[:-KEEP_VERSIONS]:
+        shutil.rmtree(os.path.join(sym_dir, old), ignore_errors=True)
+
+    return meta
+
+
+def _current_dir(symbol: str) -> Optional[str]:
+    sym_dir = _symbol_dir(symbol)
+    try:
+        with open(os.path.join(sym_dir, CURRENT_FILE)) as fh:
+            version = fh.read().strip()
+    except FileNotFoundError:
+        return None
+    return os.path.join(sym_dir, version)
+
+
+def _read_meta_at(base: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(base, "meta.json")) as fh:
+            return json.load(fh)
+    except FileNotFoundError:
+        return None
+
+
+def read_meta(symbol: str) -> Optional[Dict[str, Any]]:
+    base = _current_dir(symbol)
+    return _read_meta_at(base) if base else None
+
+
+def list_symbols() -> List[str]:
+    if not os.path.isdir(STORE_DIR):
+        return []
+    return sorted(
+        d for d in os.listdir(STORE_DIR)
+        if os.path.exists(os.path.join(STORE_DIR, d, CURRENT_FILE))
+    )
+
+
+def query_symbol(
+    symbol: str,
+    from_date: Optional[str] = None,
+    to_date: Optional[str] = None,
+    freq: str = "D",
+    fields: Optional[List[str]] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Rango [from_date, to_date] (inclusive), resample D/W/M y proyección de campos.
+    Devuelve None si el símbolo no está en el store.
+    """
+    # resolvemos la versión una sola vez: todo lo que sigue lee de `base`
+    base = _current_dir(symbol)
+    meta = _read_meta_at(base) if base else None
+    if meta is None:
+        return None
+
+    freq = (freq or "D").upper()
+    if freq != "D" and freq not in RESAMPLE_UNITS:
+        raise ValueError(f"freq inválida: {freq} (usar D, W o M)")
+
+    available = meta["fields"]
+    if fields:
+        unknown = [f for f in fields if f not in available]
+        if unknown:
+            raise ValueError(f"Campos inexistentes para {meta['symbol']}: {unknown}")
+        selected = list(fields)
+    else:
+        selected = list(available)
+
+    dates = np.load(os.path.join(base, "dates.npy"), mmap_mode="r")
+
+    lo = 0
+    hi = dates.size
+    if from_date:
+        d = _parse_date(from_date)
+        if d is None:
+            raise ValueError(f"from_date inválida: {from_date}")
+        lo = int(np.searchsorted(dates, d, side="left"))
+    if to_date:
+        d = _parse_date(to_date)
+        if d is None:
+            raise ValueError(f"to_date inválida: {to_date}")
+        hi = int(np.searchsorted(dates, d, side="right"))
+    hi = max(lo, hi)
+
+    sl_dates = np.asarray(dates[lo:hi])
+
+    # índices a devolver dentro del slice
+    if freq == "D" or sl_dates.size == 0:
+        idx = np.arange(sl_dates.size)
+    else:
+        # numpy arranca la semana en jueves (epoch); +3 días -> semanas lunes a domingo
+        shifted = sl_dates + np.timedelta64(3, "D") if freq == "W" else sl_dates
+        periods = shifted.astype(f"datetime64[{RESAMPLE_UNITS[freq]}]")
+        # último dato de cada período
+        last = np.append(periods[1:] != periods[:-1], True)
+        idx = np.nonzero(last)[0]
+
+    out: Dict[str, Any] = {
+        "symbol": meta["symbol"],
+        "freq": freq,
+        "from_date": str(sl_dates[0]) if sl_dates.size else None,
+        "to_date": str(sl_dates[-1]) if sl_dates.size else None,
+        "rows": int(idx.size),
+        "dates": [str(d) for d in sl_dates[idx]],
+        "fields": {},
+    }
+
+    for f in selected:
+        col = np.load(os.path.join(base, f"{f}.npy"), mmap_mode="r")
+        values = np.asarray(col[lo:hi])[idx]
+        out["fields"][f] = [None if np.isnan(v) else float(v) for v in values]
+
+    return out
@@ -0,0 +1,223 @@
+import os
+import json
+import hashlib
+import datetime as dt
+from typing import Dict, Any, Optional
+
+import numpy as np
+
+from services.classify import classify_instrument, RULES
+from services.docta_models import DoctaTable, CASHFLOW_DATE_KEYS, compact, to_date
+
+# ============================
+# REGISTRO DE INSTRUMENTOS
+# ============================
+# symbol -> {"asset_type", "currency", "group", + metadata de cashflows}
+# - clasificación: reglas de classify.py, memoizada por (group, symbol)
+# - overrides: JSON local {symbol: {...}} que pisa reglas y metadata
+# - metadata: vencimiento / amortización / tipo de cupón desde cashflows
+# - se persiste en REGISTRY_PATH y se recarga al reiniciar
+REGISTRY_PATH = os.environ.get("INSTRUMENT_REGISTRY_PATH", os.path.join("data", "instruments.json"))
+OVERRIDES_PATH = os.environ.get("INSTRUMENT_OVERRIDES_PATH", os.path.join("data", "instrument_overrides.json"))
+
+CLASS_KEYS = ("asset_type", "currency", "group")
+
+# si cambian las reglas, la clasificación persistida se descarta (la metadata no)
+RULES_VERSION = hashlib.sha1(json.dumps(RULES).encode()).hexdigest()[:12]
+
+AMORTIZATION_KEYS = ("amortization", "amortizacion", "capital")
+RATE_KEYS = ("coupon_rate", "rate", "tasa")
+# campos que produce cashflow_metadata
+META_KEYS = ("maturity", "n_payments", "amortization", "coupon_type")
+
+_registry: Dict[str, Dict[str, Any]] = {}
+_overrides: Dict[str, Dict[str, Any]] = {}
+_loaded = False
+_dirty = False
+
+
+def _read_json(path: str) -> Dict[str, Any]:
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path) as fh:
+            data = json.load(fh)
+    except (OSError, ValueError) as e:
+        print(f"❌ instruments: no se pudo leer {path}:", str(e))
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _ensure_loaded() -> None:
+    global _loaded
+    if _loaded:
+        return
+    _loaded = True
+    _overrides.update({k.upper(): v for k, v in _read_json(OVERRIDES_PATH).items() if isinstance(v, dict)})
+
+    stored = _read_json(REGISTRY_PATH)
+    stale = stored.get("rules_version") != RULES_VERSION
+    for k, v in (stored.get("instruments") or {}).items():
+        if not isinstance(v, dict):
+            continue
+        if stale:
+            v = {f: x for f, x in v.items() if f not in CLASS_KEYS}
+        _registry[k.upper()] = v
+
+    for k, ov in _overrides.items():
+        _registry[k] = {**_registry.get(k, {}), **ov}
+
+
+def classify(group: str, symbol: str) -> Dict[str, Any]:
+    """
+    Lookup memoizado. Devuelve sólo asset_type / currency / group.
+    """
+    _ensure_loaded()
+    global _dirty
+    s = symbol.upper().strip()
+
+    entry = _registry.get(s)
+    if entry is None or entry.get("group") != group:
+        cls = classify_instrument(group, s)
+        entry = {**(entry or {}), **cls, **_overrides.get(s, {})}
+        _registry[s] = entry
+        _dirty = True
+
+    return {k: entry.get(k) for k in CLASS_KEYS}
+
+
+def get(symbol: str) -> Optional[Dict[str, Any]]:
+    _ensure_loaded()
+    return _registry.get(symbol.upper().strip())
+
+
+def all_instruments() -> Dict[str, Dict[str, Any]]:
+    """
+    Copia del registro: los endpoints lo iteran en otro thread mientras el
+    scheduler agrega símbolos (las entradas se reemplazan, nunca se mutan).
+    """
+    _ensure_loaded()
+    return _registry.copy()
+
+
+def _column(table: DoctaTable, keys) -> Optional[Any]:
+    for k in keys:
+        col = table.column(k)
+        if col is not None:
+            return col
+    return None
+
+
+def _numeric(table: DoctaTable, keys) -> Optional[np.ndarray]:
+    for k in keys:
+        col = table.numbers.get(k)
+        if col is not None:
+            vals = col.astype(np.float64)
+            return vals[~np.isnan(vals)]
+    return None
+
+
+def _rates_by_date(table: DoctaTable, dates: Optional[Any]) -> Optional[np.ndarray]:
+    """
+    Tasas informadas ordenadas por fecha de pago (sin NaN).
+    """
+    for k in RATE_KEYS:
+        col = table.numbers.get(k)
+        if col is None:
+            continue
+        vals = col.astype(np.float64)
+        if dates is not None:
+            keys = [to_date(d) or dt.date.max for d in dates]
+            vals = vals[sorted(range(len(vals)), key=keys.__getitem__)]
+        return vals[~np.isnan(vals)]
+    return None
+
+
+def _coupon_type(rates: np.ndarray) -> Optional[str]:
+    """
+    zero | fixed | step_up (tasas que sólo suben, ej. AL/GD).
+    Si las tasas varían sin patrón (flotantes) no se puede saber: None.
+    """
+    r = np.round(rates, 6)
+    distinct = set(r.tolist())
+    if not distinct or distinct == {0.0}:
+        return "zero"
+    if len(distinct) == 1:
+        return "fixed"
+    if bool((np.diff(r) >= 0).all()):
+        return "step_up"
+    return None
+
+
+def cashflow_metadata(payload: Any) -> Dict[str, Any]:
+    """
+    maturity: último pago
+    amortization: bullet | amortizing (según cuántos pagos amortizan capital)
+    coupon_type: zero | fixed | step_up (según las tasas informadas; sin dato si no se puede inferir)
+    """
+    table = payload if isinstance(payload, DoctaTable) else compact(payload)
+    if not isinstance(table, DoctaTable) or not len(table):
+        return {}
+
+    meta: Dict[str, Any] = {}
+
+    dates = _column(table, CASHFLOW_DATE_KEYS)
+    if dates is not None:
+        parsed = [d for d in map(to_date, dates) if d]
+        if parsed:
+            meta["maturity"] = max(parsed).isoformat()
+            meta["n_payments"] = len(parsed)
+
+    amort = _numeric(table, AMORTIZATION_KEYS)
+    if amort is not None:
+        meta["amortization"] = "amortizing" if int((amort > 0).sum()) > 1 else "bullet"
+
+    rates = _rates_by_date(table, dates)
+    if rates is not None:
+        coupon_type = _coupon_type(rates)
+        if coupon_type:
+            meta["coupon_type"] = coupon_type
+
+    return meta
+
+
+def enrich_from_cashflows(cashflows: Dict[str, Any]) -> int:
+    """
+    Agrega metadata de cashflows al registro. Devuelve cuántos símbolos cambiaron.
+    """
+    _ensure_loaded()
+    global _dirty
+    changed = 0
+
+    for sym, payload in cashflows.items():
+        s = sym.upper().strip()
+        meta = cashflow_metadata(payload)
+        if not meta:
+            continue
+        entry = _registry.setdefault(s, {})
+        # la metadata nueva reemplaza entera a la anterior (un campo que ya no
+        # se puede inferir no queda con el valor viejo); los overrides siempre ganan
+        base = {k: v for k, v in entry.items() if k not in META_KEYS}
+        new = {**base, **meta, **_overrides.get(s, {})}
+        if new != entry:
+            _registry[s] = new
+            changed += 1
+
+    if changed:
+        _dirty = True
+    return changed
+
+
+def save() -> None:
+    """
+    Persiste el registro si hubo cambios (escritura atómica).
+    """
+    global _dirty
+    if not _dirty:
+        return
+    os.makedirs(os.path.dirname(REGISTRY_PATH) or ".", exist_ok=True)
+    tmp = REGISTRY_PATH + ".tmp"
+    with open(tmp, "w") as fh:
+        json.dump({"rules_version": RULES_VERSION, "instruments": _registry}, fh, sort_keys=True)
+    os.replace(tmp, REGISTRY_PATH)
+    _dirty = False